@@ -0,0 +1,18 @@
+-- 001: generate QR codes server-side
+--
+-- The app used to loop client-side (random 5-char code + SELECT probe)
+-- until it found a free code. Let Postgres assign the code on INSERT
+-- instead: one round-trip, no probe loop, race-safe under the unique
+-- index. Codes keep the original 5-char A-Z/0-9 alphabet (36^5 ≈ 60M
+-- combinations); the rare collision aborts the INSERT and the app
+-- retries. Apply with: psql "$DB_URL" -f 001_qrcode_server_side_code.sql
+
+CREATE UNIQUE INDEX IF NOT EXISTS qrcode_code_uq ON qrcode (code);
+
+CREATE OR REPLACE FUNCTION gen_qr_code() RETURNS text AS $$
+    SELECT string_agg(substr('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789', (floor(random() * 36))::int + 1, 1), '')
+    FROM generate_series(1, 5)
+$$ LANGUAGE sql VOLATILE;
+
+ALTER TABLE qrcode
+    ALTER COLUMN code SET DEFAULT gen_qr_code();
@@ -0,0 +1,23 @@
+-- 002: index the hot lookup paths
+--
+-- The validator's SELECT active FROM <zone table> WHERE code = ... and
+-- the duplicate check in submit_info ran as sequential scans, growing
+-- linearly with the table. The INCLUDE (active) covering indexes let
+-- Postgres answer the validate query from the index alone.
+-- Apply with: psql "$DB_URL" -f 002_validate_indexes.sql
+
+CREATE UNIQUE INDEX IF NOT EXISTS qr_corridoio_code_uq
+    ON qr_corridoio (code) INCLUDE (active);
+CREATE UNIQUE INDEX IF NOT EXISTS qr_cancello_code_uq
+    ON qr_cancello (code) INCLUDE (active);
+CREATE UNIQUE INDEX IF NOT EXISTS qr_ingresso_boungaville_code_uq
+    ON qr_ingresso_boungaville (code) INCLUDE (active);
+
+-- Backs the duplicate check in submit_info (same person, same dates)
+CREATE UNIQUE INDEX IF NOT EXISTS qrcode_person_dates_uq
+    ON qrcode (name, surname, date_in, date_out);
+
+ANALYZE qrcode;
+ANALYZE qr_corridoio;
+ANALYZE qr_cancello;
+ANALYZE qr_ingresso_boungaville;
@@ -0,0 +1,8 @@
+-- 003: index qrcode.date_out for the expiry sweep
+--
+-- check_qrcodes_loop now deletes expired codes with a single
+-- DELETE ... WHERE date_out < CURRENT_DATE every 30s; this index keeps
+-- that sweep off a sequential scan.
+-- Apply with: psql "$DB_URL" -f 003_date_out_index.sql
+
+CREATE INDEX IF NOT EXISTS qrcode_date_out_idx ON qrcode (date_out);
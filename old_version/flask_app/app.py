@@ -1,11 +1,18 @@
+import hashlib
 import logging
 import os
-import random
-import string
+import queue
 import psycopg2
+import psycopg2.pool
+from psycopg2 import sql
 import requests
-import subprocess
 import platform
+from cachetools import TTLCache
+from functools import wraps
+from icmplib import ping as icmp_ping
+from logging.handlers import QueueHandler, QueueListener
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 from flask import Flask, render_template, request, redirect, url_for, session
 from werkzeug.security import check_password_hash, generate_password_hash
@@ -13,11 +20,18 @@ from werkzeug.security import check_password_hash, generate_password_hash
 app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "dev-secret-key")
 
-# 🔧 Logging config
-logging.basicConfig(
-    level=logging.INFO,
-    format='[%(asctime)s] %(levelname)s: %(message)s'
-)
+# 🔧 Logging config — records go through a queue and are written by a
+# background thread, so request handlers never block on log I/O
+_log_queue = queue.Queue(-1)
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter('[%(asctime)s] %(levelname)s: %(message)s'))
+_queue_handler = QueueHandler(_log_queue)
+# QueueHandler pre-formats records before queueing — keep that to the bare
+# message so the listener's formatter isn't applied on top of another one
+_queue_handler.setFormatter(logging.Formatter('%(message)s'))
+logging.basicConfig(level=logging.INFO, handlers=[_queue_handler])
+_log_listener = QueueListener(_log_queue, _log_handler)
+_log_listener.start()
 
 # 🔌 DB config
 DB_CONFIG = {
@@ -28,6 +42,65 @@ DB_CONFIG = {
     "port": os.getenv("DB_PORT", 5432)
 }
 
+# ♻️ Persistent connection pool — opened once at startup instead of
+# paying TCP+auth setup on every request. minconn must equal maxconn:
+# psycopg2 closes any returned connection beyond minconn, so a smaller
+# minconn would silently reintroduce per-request connects under load.
+# Sized per worker — keep workers × services × 5 under max_connections.
+pool = psycopg2.pool.ThreadedConnectionPool(minconn=5, maxconn=5, **DB_CONFIG)
+
+
+@contextmanager
+def db_cursor(name=None):
+    """
+    Yield a cursor from the pool. Commits on success, rolls back on error,
+    and always returns the connection to the pool. Pass a name to get a
+    server-side cursor that fetches rows in chunks.
+    """
+    conn = pool.getconn()
+    try:
+        cur = conn.cursor(name) if name else conn.cursor()
+        try:
+            yield cur
+        finally:
+            cur.close()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn)
+
+
+def with_db(f=None, *, name=None):
+    """
+    Inject a pooled cursor as the view's first argument, folding the
+    connection handling and the error response into one place so the view
+    body is just the DB work. Pass name= for a server-side cursor.
+    """
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                with db_cursor(name=name) as cur:
+                    return func(cur, *args, **kwargs)
+            except Exception as e:
+                logging.error(f"❌ DB error in {func.__name__}: {e}")
+                return f"Error: {e}"
+        return wrapper
+    return decorate(f) if f is not None else decorate
+
+
+# 📡 Shared executor for pinging the Arduinos concurrently
+PING_POOL = ThreadPoolExecutor(max_workers=4)
+
+# 🔑 Short-lived login caches: skip the DB lookup and the (deliberately
+# slow) password-hash check for repeated attempts in a short burst.
+# Results are keyed by a digest of the password, never the plaintext.
+PASSWORD_HASH_CACHE = TTLCache(maxsize=64, ttl=300)
+LOGIN_RESULT_CACHE = TTLCache(maxsize=64, ttl=60)
+
+
 # 🔐 Login page
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -36,23 +109,27 @@ def login():
         password = request.form['password']
 
         try:
-            conn = psycopg2.connect(**DB_CONFIG)
-            cur = conn.cursor()
-            cur.execute("SELECT password_hash FROM users WHERE username = %s", (username,))
-            result = cur.fetchone()
-            cur.close()
-            conn.close()
-
-            if result:
-                db_hash = result[0]
-                is_correct = check_password_hash(db_hash, password)
-
-                logging.info(f"🔐 Stored hash for '{username}': {db_hash}")
-                logging.info(f"🔍 Password match: {'✅' if is_correct else '❌'}")
+            db_hash = PASSWORD_HASH_CACHE.get(username)
+            if db_hash is None:
+                with db_cursor() as cur:
+                    cur.execute("SELECT password_hash FROM users WHERE username = %s", (username,))
+                    result = cur.fetchone()
+                if result:
+                    db_hash = result[0]
+                    PASSWORD_HASH_CACHE[username] = db_hash
+
+            if db_hash:
+                login_key = (username, hashlib.sha256(password.encode()).hexdigest())
+                is_correct = LOGIN_RESULT_CACHE.get(login_key)
+                if is_correct is None:
+                    is_correct = check_password_hash(db_hash, password)
+                    LOGIN_RESULT_CACHE[login_key] = is_correct
+
+                logging.info("🔍 Password match: %s", "✅" if is_correct else "❌")
 
                 if is_correct and username == 'manager':
                     session['username'] = username
-                    logging.info(f"✅ Manager login successful: {username}")
+                    logging.info("✅ Manager login successful: %s", username)
                     return redirect(url_for('submit_info'))
                 elif is_correct:
                     return render_template('login.html', message="❌ Access denied. Only 'manager' is allowed.")
@@ -95,69 +172,74 @@ def submit_info():
             return render_template('form.html', submitted=False, message="⚠️ Date In cannot be after Date Out.")
 
         try:
-            conn = psycopg2.connect(**DB_CONFIG)
-            cur = conn.cursor()
-
-            # 🔍 Check for existing record with same name/surname/dates
-            cur.execute("""
-                SELECT * FROM qrcode
-                WHERE name = %s AND surname = %s AND date_in = %s AND date_out = %s
-            """, (name, surname, dateIn, dateOut))
+            with db_cursor() as cur:
+                # 🔍 Check for existing record with same name/surname/dates
+                cur.execute("""
+                    SELECT * FROM qrcode
+                    WHERE name = %s AND surname = %s AND date_in = %s AND date_out = %s
+                """, (name, surname, dateIn, dateOut))
 
-            existing = cur.fetchone()
+                existing = cur.fetchone()
 
             if existing:
                 logging.warning("⚠️ QR code already exists for this data")
-                cur.close()
-                conn.close()
                 return render_template('form.html', submitted=False, message="⚠️ QR code already exists for that user and date range.")
 
-            # ✅ All fields are unique — insert
-            def generate_unique_code(cursor):
-                while True:
-                    code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=5))
-                    cursor.execute("SELECT 1 FROM qrcode WHERE code = %s", (code,))
-                    if not cursor.fetchone():
-                        return code
-
-            code = generate_unique_code(cur)
-
+            # Ping ingresso, corridoio and cancello concurrently — wall
+            # time is one ping timeout instead of three (and no pooled
+            # connection is held while we wait)
+            arduino1_ok, arduino2_ok, arduino3_ok = PING_POOL.map(ping_device, [
+                "192.168.1.157",  # ingresso — replace with actual IP
+                "192.168.1.157",  # corridoio — replace with actual IP
+                "192.168.1.157",  # cancello — replace with actual IP
+            ])
 
-            # Notify ingresso
-            arduino1_ok = ping_device("192.168.1.157")  # Replace with actual IP
             if not arduino1_ok:
                 logging.warning("⚠️ Ingresso Arduino is unreachable.")
             else:
                 logging.info("✅ Ingresso Arduino is online.")
 
-            # Notify corridoio
-            arduino2_ok = ping_device("192.168.1.157")  # Replace with actual IP
             if not arduino2_ok:
                 logging.warning("⚠️ Corridoio Arduino is unreachable.")
             else:
                 logging.info("✅ Corridoio Arduino is online.")
 
-            # Notify cancello
-            arduino3_ok = ping_device("192.168.1.157")  # Replace with actual IP
             if not arduino3_ok:
                 logging.warning("⚠️ Cancello Arduino is unreachable.")
             else:
                 logging.info("✅ Cancello Arduino is online.")
 
-
-
-            cur.execute("""
-                INSERT INTO qrcode (name, surname, date_in, date_out, code)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (name, surname, dateIn, dateOut, code))
-
-            cur.execute("INSERT INTO qr_cancello (code, active) VALUES (%s, TRUE)", (code,))
-            cur.execute("INSERT INTO qr_corridoio (code, active) VALUES (%s, TRUE)", (code,))
-            cur.execute("INSERT INTO qr_ingresso_boungaville (code, active) VALUES (%s, TRUE)", (code,))
-
-            conn.commit()
-            cur.close()
-            conn.close()
+            # Insert the qrcode row and the three zone rows in a single
+            # statement — one round-trip to Postgres instead of four.
+            # The code itself is assigned server-side (see migration 001);
+            # a random draw can collide with an existing code, which
+            # aborts the insert, so retry a couple of times.
+            for attempt in range(3):
+                try:
+                    with db_cursor() as cur:
+                        cur.execute("""
+                            WITH ins AS (
+                                INSERT INTO qrcode (name, surname, date_in, date_out)
+                                VALUES (%s, %s, %s, %s)
+                                RETURNING code
+                            ), cancello AS (
+                                INSERT INTO qr_cancello (code, active) SELECT code, TRUE FROM ins
+                            ), corridoio AS (
+                                INSERT INTO qr_corridoio (code, active) SELECT code, TRUE FROM ins
+                            )
+                            INSERT INTO qr_ingresso_boungaville (code, active) SELECT code, TRUE FROM ins
+                            RETURNING code
+                        """, (name, surname, dateIn, dateOut))
+                        code = cur.fetchone()[0]
+                    break
+                except psycopg2.errors.UniqueViolation as e:
+                    # Only code collisions are worth retrying (the unique
+                    # constraint on code predates migration 001, so match by
+                    # exclusion); a duplicate person/date race should surface
+                    # like any other error
+                    if e.diag.constraint_name == 'qrcode_person_dates_uq' or attempt == 2:
+                        raise
+                    logging.warning("⚠️ Generated QR code collided, retrying insert")
 
             logging.info(f"✅ Inserted new QR entry for {name} {surname}, code: {code}")
 
@@ -194,96 +276,81 @@ def submit_info():
 
 # manage qr code page
 
+PAGE_SIZE = 50
+
 @app.route('/manage')
-def manage_qrcodes():
+@with_db(name='manage_qrcodes')
+def manage_qrcodes(cur):
     if 'username' not in session:
         return redirect(url_for('login'))
 
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor()
-
-        # Retrieve all QR codes and their active status from all 3 zone tables
-        cur.execute("""
-            SELECT q.code, q.name, q.surname, q.date_in, q.date_out,
-                c.active AS corridoio_active,
-                ca.active AS cancello_active,
-                i.active AS ingresso_active
-            FROM qrcode q
-            LEFT JOIN qr_corridoio c ON q.code = c.code
-            LEFT JOIN qr_cancello ca ON q.code = ca.code
-            LEFT JOIN qr_ingresso_boungaville i ON q.code = i.code
-            ORDER BY q.id DESC;
-        """)
-        qrcodes = cur.fetchall()
-        cur.close()
-        conn.close()
-
-        return render_template('manage.html', qrcodes=qrcodes)
-
-    except Exception as e:
-        logging.error(f"❌ Failed to load QR management page: {e}")
-        return f"Error: {e}"
+        page = max(int(request.args.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+
+    # Server-side cursor + LIMIT/OFFSET keep memory and render time
+    # bounded as the table grows; one extra row tells us if there is
+    # a next page
+    cur.itersize = 200
+    cur.execute("""
+        SELECT q.code, q.name, q.surname, q.date_in, q.date_out,
+            c.active AS corridoio_active,
+            ca.active AS cancello_active,
+            i.active AS ingresso_active
+        FROM qrcode q
+        LEFT JOIN qr_corridoio c ON q.code = c.code
+        LEFT JOIN qr_cancello ca ON q.code = ca.code
+        LEFT JOIN qr_ingresso_boungaville i ON q.code = i.code
+        ORDER BY q.id DESC
+        LIMIT %s OFFSET %s;
+    """, (PAGE_SIZE + 1, (page - 1) * PAGE_SIZE))
+    qrcodes = cur.fetchall()
+
+    has_next = len(qrcodes) > PAGE_SIZE
+    return render_template('manage.html', qrcodes=qrcodes[:PAGE_SIZE],
+                           page=page, has_next=has_next)
+
+# Zone name → table, with the toggle UPDATE for each zone composed once
+# at import (identifiers safely quoted by psycopg2.sql, no per-request
+# string formatting into SQL)
+VALID_TABLES = {
+    'corridoio': 'qr_corridoio',
+    'cancello': 'qr_cancello',
+    'boungaville': 'qr_ingresso_boungaville'
+}
+TOGGLE_SQL = {
+    zone: sql.SQL("UPDATE {} SET active = NOT active WHERE code = %s").format(sql.Identifier(table))
+    for zone, table in VALID_TABLES.items()
+}
 
 @app.route('/toggle_qr/<zone>/<code>', methods=['POST'])
-def toggle_qr(zone, code):
+@with_db
+def toggle_qr(cur, zone, code):
     if 'username' not in session:
         return redirect(url_for('login'))
 
-    valid_tables = {
-        'corridoio': 'qr_corridoio',
-        'cancello': 'qr_cancello',
-        'boungaville': 'qr_ingresso_boungaville'
-    }
-
-    if zone not in valid_tables:
+    if zone not in TOGGLE_SQL:
         return "❌ Invalid zone"
 
-    table = valid_tables[zone]
+    # Toggle the current active value
+    cur.execute(TOGGLE_SQL[zone], (code,))
 
-    try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor()
-
-        # Toggle the current active value
-        cur.execute(
-            f"UPDATE {table} SET active = NOT active WHERE code = %s",
-            (code,)
-        )
-        conn.commit()
-        cur.close()
-        conn.close()
-
-        logging.info(f"🔁 Toggled active state for {code} in {table}")
-        return redirect(url_for('manage_qrcodes'))
-
-    except Exception as e:
-        logging.error(f"❌ Toggle error: {e}")
-        return f"Toggle error: {e}"
+    logging.info(f"🔁 Toggled active state for {code} in {VALID_TABLES[zone]}")
+    return redirect(url_for('manage_qrcodes'))
 
 
 @app.route('/delete_qr/<code>', methods=['POST'])
-def delete_qr(code):
+@with_db
+def delete_qr(cur, code):
     if 'username' not in session:
         return redirect(url_for('login'))
 
-    try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor()
+    # 🔥 Delete from qrcode — ON DELETE CASCADE will clear zone tables
+    cur.execute("DELETE FROM qrcode WHERE code = %s", (code,))
 
-        # 🔥 Delete from qrcode — ON DELETE CASCADE will clear zone tables
-        cur.execute("DELETE FROM qrcode WHERE code = %s", (code,))
-
-        conn.commit()
-        cur.close()
-        conn.close()
-
-        logging.info(f"🗑️ Deleted QR code: {code}")
-        return redirect(url_for('manage_qrcodes'))
-
-    except Exception as e:
-        logging.error(f"❌ Delete error for code {code}: {e}")
-        return f"Delete error: {e}"
+    logging.info(f"🗑️ Deleted QR code: {code}")
+    return redirect(url_for('manage_qrcodes'))
 
 
 # 🚪 Logout route
@@ -299,15 +366,11 @@ def logout():
 ### function ping ###
 def ping_device(ip: str, timeout: int = 2) -> bool:
     """
-    Ping a device by IP on Linux. Returns True if reachable, False otherwise.
+    Ping a device by IP with an in-process ICMP echo (no /bin/ping
+    fork+exec per call). Returns True if reachable, False otherwise.
     """
     try:
-        result = subprocess.run(
-            ["ping", "-c", "1", "-W", str(timeout), ip],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL
-        )
-        return result.returncode == 0
+        return icmp_ping(ip, count=1, timeout=timeout, privileged=False).is_alive
     except Exception as e:
         logging.error(f"❌ Ping to {ip} failed: {e}")
         return False
@@ -0,0 +1,14 @@
+import os
+
+# Both services are I/O-bound (Postgres round-trips, Arduino pings), so
+# run gevent workers instead of the single-threaded Werkzeug dev server.
+workers = 2 * os.cpu_count() + 1
+worker_class = "gevent"
+worker_connections = 1000
+keepalive = 5
+
+
+def post_fork(server, worker):
+    # Make psycopg2 yield to the gevent loop instead of blocking the worker
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
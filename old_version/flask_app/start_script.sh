@@ -1,7 +1,7 @@
 #!/bin/bash
 
-# Run app.py in the background
-python /app/app.py &
+# Run app.py under gunicorn in the background
+gunicorn -c /app/gunicorn.conf.py -b 0.0.0.0:5000 app:app &
 
-# Run verify_in_db_qrcode.py in the foreground
-python /app/verify_in_db_qrcode.py
+# Run verify_in_db_qrcode.py under gunicorn in the foreground
+gunicorn -c /app/gunicorn.conf.py -b 0.0.0.0:5001 verify_in_db_qrcode:app
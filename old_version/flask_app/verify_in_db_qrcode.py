@@ -1,16 +1,28 @@
-from flask import Flask, request, jsonify
+import falcon
 import psycopg2
+import psycopg2.pool
 import os
 import logging
+import queue
 import threading
 import requests
 import time
-from datetime import date
-
-# 🧾 Configure logging
-logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s: %(message)s')
-
-app = Flask(__name__)
+from cachetools import TTLCache
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+
+# 🧾 Configure logging — records go through a queue and are written by a
+# background thread, so scan handlers never block on log I/O
+_log_queue = queue.Queue(-1)
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter('[%(asctime)s] %(levelname)s: %(message)s'))
+_queue_handler = QueueHandler(_log_queue)
+# QueueHandler pre-formats records before queueing — keep that to the bare
+# message so the listener's formatter isn't applied on top of another one
+_queue_handler.setFormatter(logging.Formatter('%(message)s'))
+logging.basicConfig(level=logging.INFO, handlers=[_queue_handler])
+_log_listener = QueueListener(_log_queue, _log_handler)
+_log_listener.start()
 
 DB_CONFIG = {
     "dbname": os.getenv("DB_NAME"),
@@ -20,81 +32,174 @@ DB_CONFIG = {
     "port": os.getenv("DB_PORT", 5432)
 }
 
-def validate_code_in_table(code, table_name):
-    logging.info(f"📥 Validating code '{code}' in table '{table_name}'")
+# ♻️ Persistent connection pool — scans are frequent, so don't pay
+# TCP+auth setup on every validation request. minconn must equal maxconn:
+# psycopg2 closes any returned connection beyond minconn, which would
+# also keep throwing away the connections our statements are PREPAREd on.
+# Sized per worker — keep workers × services × 5 under max_connections.
+pool = psycopg2.pool.ThreadedConnectionPool(minconn=5, maxconn=5, **DB_CONFIG)
+
+
+@contextmanager
+def db_cursor():
+    """
+    Yield a cursor from the pool. Commits on success, rolls back on error,
+    and always returns the connection to the pool.
+    """
+    conn = pool.getconn()
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
         cur = conn.cursor()
-        cur.execute(f"SELECT active FROM {table_name} WHERE code = %s", (code,))
-        result = cur.fetchone()
-        cur.close()
-        conn.close()
+        try:
+            yield cur
+        finally:
+            cur.close()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn)
+
+
+# Named prepared statements for the hot validate query — Postgres parses
+# and plans each one once per connection instead of on every scan
+VALIDATE_STMTS = {
+    "qr_corridoio": "validate_corridoio",
+    "qr_cancello": "validate_cancello",
+    "qr_ingresso_boungaville": "validate_ingresso",
+}
+PREPARED_CONNS = set()
+
+# ⚡ Short-lived result cache: repeated scans of the same code within a
+# few seconds never hit Postgres at all
+VALIDATE_CACHE = TTLCache(maxsize=4096, ttl=5)
+_CACHE_MISS = object()
+
+
+def fetch_active_flag(code, table_name):
+    """Run the validate lookup through a per-connection prepared statement."""
+    for attempt in (1, 2):
+        try:
+            with db_cursor() as cur:
+                conn_id = id(cur.connection)
+                if conn_id not in PREPARED_CONNS:
+                    for table, stmt in VALIDATE_STMTS.items():
+                        cur.execute(f"PREPARE {stmt} (text) AS SELECT active FROM {table} WHERE code = $1")
+                    PREPARED_CONNS.add(conn_id)
+                cur.execute(f"EXECUTE {VALIDATE_STMTS[table_name]} (%s)", (code,))
+                return cur.fetchone()
+        except psycopg2.errors.InvalidSqlStatementName:
+            # A recycled pool connection can reuse the id of an old one —
+            # forget it and prepare again
+            PREPARED_CONNS.discard(conn_id)
+            if attempt == 2:
+                raise
+
+
+def validate_code_in_table(code, table_name):
+    logging.info("📥 Validating code '%s' in table '%s'", code, table_name)
+    try:
+        result = VALIDATE_CACHE.get((table_name, code), _CACHE_MISS)
+        if result is _CACHE_MISS:
+            result = fetch_active_flag(code, table_name)
+            VALIDATE_CACHE[(table_name, code)] = result
 
         if result is None:
-            logging.info(f"❌ QR code '{code}' not found in table '{table_name}'")
+            logging.info("❌ QR code '%s' not found in table '%s'", code, table_name)
             return {"status": "not_found", "message": f"QR code '{code}' does not exist"}, 404
 
         is_active = result[0]
         if is_active:
-            logging.info(f"✅ QR code '{code}' is active in '{table_name}'")
+            logging.info("✅ QR code '%s' is active in '%s'", code, table_name)
             return {"status": "success", "message": f"QR code '{code}' is valid and active"}, 200
         else:
-            logging.info(f"⚠️ QR code '{code}' is found but inactive in '{table_name}'")
+            logging.info("⚠️ QR code '%s' is found but inactive in '%s'", code, table_name)
             return {"status": "inactive", "message": f"QR code '{code}' exists but is inactive"}, 403
 
     except Exception as e:
         logging.error(f"❌ Database error while checking code '{code}' in '{table_name}': {e}")
         return {"status": "error", "message": f"Database error: {e}"}, 500
 
-@app.route('/validate_qr_corridoio', methods=['POST'])
-def validate_qr_corridoio():
-    data = request.json
-    code = data.get('code', '').strip().upper()
-    if not code:
-        return jsonify({"status": "error", "message": "QR code missing"}), 400
-    return jsonify(*validate_code_in_table(code, "qr_corridoio"))
+def validate_code_in_all_zones(code):
+    """Check a code against all three zone tables with a single round-trip."""
+    logging.info("📥 Validating code '%s' in all zones", code)
+    try:
+        with db_cursor() as cur:
+            cur.execute("""
+                SELECT 'corridoio' AS zone, active FROM qr_corridoio WHERE code = %s
+                UNION ALL
+                SELECT 'cancello', active FROM qr_cancello WHERE code = %s
+                UNION ALL
+                SELECT 'ingresso', active FROM qr_ingresso_boungaville WHERE code = %s
+            """, (code, code, code))
+            rows = cur.fetchall()
+
+        if not rows:
+            logging.info("❌ QR code '%s' not found in any zone", code)
+            return {"status": "not_found", "message": f"QR code '{code}' does not exist"}, 404
 
-@app.route('/validate_qr_cancello', methods=['POST'])
-def validate_qr_cancello():
-    data = request.json
-    code = data.get('code', '').strip().upper()
-    if not code:
-        return jsonify({"status": "error", "message": "QR code missing"}), 400
-    return jsonify(*validate_code_in_table(code, "qr_cancello"))
+        zones = {zone: active for zone, active in rows}
+        logging.info("✅ QR code '%s' found, zones: %s", code, zones)
+        return {"status": "success", "code": code, "zones": zones}, 200
+
+    except Exception as e:
+        logging.error(f"❌ Database error while checking code '{code}' in all zones: {e}")
+        return {"status": "error", "message": f"Database error: {e}"}, 500
 
-@app.route('/validate_qr_ingresso_boungaville', methods=['POST'])
-def validate_qr_ingresso():
-    data = request.json
+def request_code(req, resp):
+    """Pull the scanned code out of a request; set a 400 and return None if missing."""
+    data = req.get_media(default_when_empty={})
     code = data.get('code', '').strip().upper()
     if not code:
-        return jsonify({"status": "error", "message": "QR code missing"}), 400
-    return jsonify(*validate_code_in_table(code, "qr_ingresso_boungaville"))
+        resp.media = {"status": "error", "message": "QR code missing"}
+        resp.status = falcon.HTTP_400
+        return None
+    return code
+
+class ValidateZone:
+    """Shared resource behind the three /validate_qr_* endpoints."""
+
+    def __init__(self, table_name):
+        self.table_name = table_name
+
+    def on_post(self, req, resp):
+        code = request_code(req, resp)
+        if code is None:
+            return
+        body, status = validate_code_in_table(code, self.table_name)
+        resp.media = body
+        resp.status = falcon.code_to_http_status(status)
+
+class ValidateAllZones:
+    def on_post(self, req, resp):
+        code = request_code(req, resp)
+        if code is None:
+            return
+        body, status = validate_code_in_all_zones(code)
+        resp.media = body
+        resp.status = falcon.code_to_http_status(status)
+
+# Falcon strips Flask's per-request context/templating overhead — this
+# service is parse → one lookup → serialize, so the framework cost shows
+app = falcon.App()
+app.add_route('/validate_qr_corridoio', ValidateZone("qr_corridoio"))
+app.add_route('/validate_qr_cancello', ValidateZone("qr_cancello"))
+app.add_route('/validate_qr_ingresso_boungaville', ValidateZone("qr_ingresso_boungaville"))
+app.add_route('/validate_qr', ValidateAllZones())
 
 # 🔁 Background thread to manage eliminate old QR codes
 def check_qrcodes_loop():
     while True:
         try:
-            conn = psycopg2.connect(**DB_CONFIG)
-            cur = conn.cursor()
-            cur.execute("SELECT code, date_in, date_out FROM qrcode")
-            all_codes = cur.fetchall()
-
-            today = date.today()
-
-            for code, date_in, date_out in all_codes:
-                code = code.strip().upper()
+            # One DELETE round-trip per tick — Postgres finds the expired
+            # rows via the date_out index (migration 003) instead of the
+            # old SELECT-everything-and-delete-one-by-one loop
+            with db_cursor() as cur:
+                cur.execute("DELETE FROM qrcode WHERE date_out < CURRENT_DATE RETURNING code")
+                deleted = cur.fetchall()
 
-                # If both dates are in the past, delete the QR code
-                if date_out < today:
-                    try:
-                        cur.execute("DELETE FROM qrcode WHERE code = %s", (code,))
-                        logging.info(f"🗑️ Deleted expired QR code: {code}")
-                    except Exception as e:
-                        logging.error(f"❌ Error deleting expired QR code {code}: {e}")
-
-            conn.commit()
-            cur.close()
-            conn.close()
+            for (code,) in deleted:
+                logging.info(f"🗑️ Deleted expired QR code: {code}")
 
         except Exception as e:
             logging.error(f"❌ Global error in QR code loop: {e}")
@@ -107,5 +212,8 @@ threading.Thread(target=check_qrcodes_loop, daemon=True).start()
 
 
 if __name__ == '__main__':
+    from wsgiref.simple_server import make_server
+
     logging.info("🚀 Starting QR code validator server on port 5001...")
-    app.run(debug=True, host="0.0.0.0", port=5001)
+    with make_server("0.0.0.0", 5001, app) as httpd:
+        httpd.serve_forever()